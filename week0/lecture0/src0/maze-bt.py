@@ -1,4 +1,7 @@
 import sys
+from array import array
+from collections import deque
+from functools import lru_cache
 
 """ 
     We are defining Nodes which will represent
@@ -20,6 +23,10 @@ class Node():
         we are saying that'B' represents the state of this node, 'A' is its parent, and 
         'swipe-right' is the action we took to get from 'A' to 'B'.
     """
+    # '__slots__' tells Python the only attributes a Node will ever have, so it can store them
+    # directly in the object instead of creating a dictionary for every single Node.
+    __slots__ = ("state", "parent", "action")
+
     def __init__(self, state, parent, action):
         self.state = state
         self.parent = parent
@@ -35,17 +42,25 @@ class Node():
     opposed to 'breadth-first search (BFS)' where we implement a 'first-in first-out' methodology.
 """
 class StackFrontier():
+    __slots__ = ("frontier", "_states")
+
     # We are initializing these attributes with this constructor since their values will not be shared with other instances.
+    # A deque lets us remove from either end in constant time, unlike a list which has to
+    # shift every remaining item when we remove from the front.
+    # We also keep the states of the nodes in a set next to the frontier so that we can look them up
+    # without going through every node.
     def __init__(self):
-        self.frontier = []
+        self.frontier = deque()
+        self._states = set()
 
     # Function to add a node to the frontier that has been passed as an argument to this method.
     def add(self, node):
         self.frontier.append(node)
+        self._states.add(node.state)
     
     # Function to see if a specific state exists in any of the nodes in the frontier. It returns a 'True' or 'False' value.
     def contains_state(self, state):
-        return any(state == node.state for node in self.frontier)
+        return state in self._states
     
     # Function to check if the frontier has become empty (meaning search is over). It returns a 'True' or 'False' value.
     def check_empty(self):
@@ -58,8 +73,10 @@ class StackFrontier():
         if self.check_empty():
             raise Exception("Empty Frontier")
         else:
-            # We can simply grab and remove the last item in the list like this.
-            return self.frontier.pop()
+            # We can simply grab and remove the last item in the deque like this.
+            node = self.frontier.pop()
+            self._states.discard(node.state)
+            return node
         
 
 """ 
@@ -67,15 +84,154 @@ class StackFrontier():
     Below, we pass the class we created above into our new entity allowing it to adopt its attributes while giving us
     the flexibility to change a specific method, in this case '.remove()'
 """
-def QueueFrontier(StackFrontier):
+class QueueFrontier(StackFrontier):
+    # No new attributes, but without this line every QueueFrontier would get a dictionary again.
+    __slots__ = ()
+
     def remove(self):
         if self.check_empty():
             raise Exception("Empty Frontier")
         else:
-            # Note that we are grabbing the first item by specifying its position in the list, i.e. '0'.
-            return self.frontier.pop(0)
+            # Note that we are grabbing the first item, i.e. the one on the left end of the deque.
+            node = self.frontier.popleft()
+            self._states.discard(node.state)
+            return node
 
         
+"""
+    Below we keep track of everything we know about a cell in a single byte per cell,
+    stored in a 'bytearray' indexed by the cell number. Each fact is one bit (flag) of
+    that byte, so checking or marking a cell is a single byte read or write instead of
+    hashing a tuple into a set:
+        - SEEN_FROM_START / SEEN_FROM_GOAL: the cell was added to the frontier of that search
+        - EXPLORED: the cell was taken out of a frontier and expanded
+    A wall is marked as already seen by both searches, so that neither of them ever adds it.
+"""
+SEEN_FROM_START = 1
+SEEN_FROM_GOAL = 2
+EXPLORED = 4
+WALL = SEEN_FROM_START | SEEN_FROM_GOAL
+
+
+"""
+    All the possible actions, along with how much they change the row and the column.
+    We define them once here rather than building new lists of them for every cell we look at.
+"""
+MOVES = (
+    ("up", -1, 0),
+    ("down", 1, 0),
+    ("left", 0, -1),
+    ("right", 0, 1),
+)
+
+
+"""
+    Which cells are next to a cell only depends on the height and width of the maze, not on
+    where its walls are. So for every shape of maze we work out once, for every cell and every
+    action in 'MOVES', the number of the cell that the action leads to, or -1 if it would leave
+    the maze. The neighbors of cell 'cell' are then the entries 4 * cell to 4 * cell + 3.
+
+    'lru_cache' keeps the tables of the last few shapes we have seen, so solving many mazes of
+    the same shape only builds the table once, and the search itself no longer needs to check
+    whether it is still inside the maze.
+"""
+@lru_cache(maxsize=16)
+def neighbor_table(height, width):
+    table = array("i")
+    for row in range(height):
+        for col in range(width):
+            for _, dr, dc in MOVES:
+                r = row + dr
+                c = col + dc
+                table.append(r * width + c if 0 <= r < height and 0 <= c < width else -1)
+    return table
+
+
+"""
+    Creating a Node object for every state we explore is the most expensive part of solving
+    a large maze. Instead, the function below numbers every cell of the maze as
+    'row * width + column' and keeps flat arrays indexed by that number:
+        - parent[cell]: the cell we came from to reach 'cell' (-1 if we haven't reached it yet)
+        - action[cell]: the position in 'MOVES' of the action that leads from 'cell' towards its parent's side
+    This way the search loop only does integer arithmetic and array indexing, and the frontiers
+    only hold cell numbers.
+
+    Rather than one search from the start, we run two breadth-first searches at the same time:
+    one from the start and one from the goal. Each of them only has to get about halfway, and
+    since the number of cells grows quickly with the distance, two half-way searches explore far
+    fewer cells than a single full one. At every step we expand the search whose frontier is
+    smaller, and we stop as soon as one of them takes out a cell that the other one has seen.
+    The path is then the way from the start to that meeting cell followed by the way from the
+    meeting cell to the goal.
+
+    Everything below exists twice: index 0 is the search from the start and index 1 is the search
+    from the goal. 'status' is the status byte of every cell before searching (only walls marked),
+    and the status of every cell after searching is returned.
+"""
+def search_grid(status, height, width, start, goal):
+    start = start[0] * width + start[1]
+    goal = goal[0] * width + goal[1]
+
+    # 'array' stores the parents as plain 4-byte integers rather than a list of references
+    # to Python int objects, which keeps large mazes small in memory.
+    parent = (array("i", [-1]) * (height * width), array("i", [-1]) * (height * width))
+    # There are only four actions, so a single byte per cell is enough to remember them
+    action = (bytearray(height * width), bytearray(height * width))
+
+    # A cell is 'seen' by a search once it has been added to its frontier. Since we never add
+    # a cell twice, this covers both "in the frontier" and "explored".
+    seen = (SEEN_FROM_START, SEEN_FROM_GOAL)
+    status = bytearray(status)
+    status[start] |= SEEN_FROM_START
+    status[goal] |= SEEN_FROM_GOAL
+    frontiers = (deque([start]), deque([goal]))
+    neighbors = neighbor_table(height, width)
+
+    num_explored = 0
+    while frontiers[0] and frontiers[1]:
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        cell = frontiers[side].popleft()
+        num_explored += 1
+        if status[cell] & seen[1 - side]:
+            return join_paths(parent, action, cell), status, num_explored
+        status[cell] |= EXPLORED
+
+        frontier, side_seen, side_parent, side_action = frontiers[side], seen[side], parent[side], action[side]
+        for move in range(4):
+            child = neighbors[4 * cell + move]
+            # Walls count as seen, so this one check skips both walls and cells we already have
+            if child != -1 and not status[child] & side_seen:
+                status[child] |= side_seen
+                side_parent[child] = cell
+                # The search from the goal walks the path backwards, so the action that leads
+                # from 'child' towards the goal is the opposite one. 'MOVES' lists opposite
+                # actions next to each other (up/down, left/right), so flipping the last bit
+                # of the position gives us the opposite action.
+                side_action[child] = move if side == 0 else move ^ 1
+                frontier.append(child)
+
+    raise Exception("no solution")
+
+
+def join_paths(parent, action, meeting_cell):
+    """Returns the (action, cell) pairs leading from the start to the goal through 'meeting_cell'."""
+
+    # Walk back from the meeting cell to the start...
+    path = []
+    cell = meeting_cell
+    while parent[0][cell] != -1:
+        path.append((action[0][cell], cell))
+        cell = parent[0][cell]
+    path.reverse()
+
+    # ...and then forward from the meeting cell to the goal
+    cell = meeting_cell
+    while parent[1][cell] != -1:
+        path.append((action[1][cell], parent[1][cell]))
+        cell = parent[1][cell]
+    return path
+
+
 """ 
     Below we are defining a 'Maze' object that gets created
     from a '.txt' file with spaces for paths, '#' for walls,
@@ -112,46 +268,31 @@ class Maze():
         self.height = len(contents)
         self.width = max(len(line) for line in contents)
 
-        # Keeping track of the walls
-        self.walls = []
-        """
-            Here we use range because we want the value of the iterative 'i'
-            to be an integer like 1 or 2. If we said, for i in self.height, 
-            the value of i would be "####B#" for instance wherease we want it
-            to be 0. 
+        # Padding every line with spaces up to the width of the maze gives us a proper grid
+        # as a single string. Anything missing at the end of a line is an open path anyway.
+        grid = "".join(line.ljust(self.width) for line in contents)
 
-            When we say range(self.height), we get (0, 3) and the iterated values 
-            are: '0, 1, 2". 
         """
-        for i in range(self.height):
-            row = []
-            for j in range(self.width):
-                try:
-                    # We are locating the start of the maze and not adding that to the
-                    # rows.
-                    if contents[i][j] == "A":
-                        self.start = (i, j)
-                        row.append(False)
-                    
-                    # Locating the goal
-                    elif contents[i][j] == "B":
-                        self.goal = (i, j)
-                        row.append(False)
-                    
-                    # Locating the paths in the maze
-                    elif contents[i][j] == " ":
-                        row.append(False)
-                    
-                    # Only adding the specific points where a wall exists, i.e. where
-                    # the hashtags are. We could have just added that as well but we 
-                    # want to locate the start and end as well, which led to this code.
-                    else:
-                        row.append(True)
-
-                except IndexError:
-                    row.append(False)
-            
-            self.walls.append(row)
+            Since the grid is one long string, we can locate the start and the goal
+            with a single search each. 'divmod' turns the position in the string back
+            into a (row, column) pair, e.g. with a width of 6, position 3 is (0, 3)
+            and position 8 is (1, 2).
+        """
+        self.start = divmod(grid.index("A"), self.width)
+        self.goal = divmod(grid.index("B"), self.width)
+
+        # Keeping track of the walls. Everything that is not the start, the goal or a
+        # path (space) is a wall, so we can build each row in one go from its slice of the grid.
+        open_cells = {"A", "B", " "}
+        self.walls = [
+            [char not in open_cells for char in grid[i * self.width:(i + 1) * self.width]]
+            for i in range(self.height)
+        ]
+
+        # The status of every cell before we start searching, with only the walls marked (see 'WALL')
+        self.initial_status = bytes(WALL if char not in open_cells else 0 for char in grid)
+        # Until 'solve' runs, nothing has been explored, so the status is the initial one
+        self.status = self.initial_status
         self.solution = None
     
     def terminal_output(self):
@@ -192,20 +333,16 @@ class Maze():
         # We are assigning the row and column numbers from the state tuple that
         # has the position of the state. 
         row, col = state
-        # We are defining all the possible actions.
-        candidates = [
-            ("up", (row - 1, col)),
-            ("down", (row + 1, col)),
-            ("left", (row, col - 1)),
-            ("right", (row, col + 1))
-        ]
+        height, width, walls = self.height, self.width, self.walls
 
         result = []
-        for action, (r, c) in candidates:
-            # For each of the actions possible in a given state, we are seeing the
-            # action name and its result in the above code. We are then attaching
-            # the possible results to the result list with the name of the action.
-            if 0 <= r < self.height and 0 <= c < self.width and not self.walls[r][c]:
+        for action, dr, dc in MOVES:
+            # For each of the actions possible in a given state, we are working out
+            # the resulting row and column. We are then attaching the possible results
+            # to the result list with the name of the action.
+            r = row + dr
+            c = col + dc
+            if 0 <= r < height and 0 <= c < width and not walls[r][c]:
                 # Resulting list is a tuple with action and resulting state from that action
                 result.append((action, (r, c)))
         return result
@@ -213,97 +350,59 @@ class Maze():
     def solve(self):
         """Finds a solution to maze, if one exists."""
 
-        # Keep track of number of states explored
-        self.num_explored = 0
-
-        # Initialize frontier to just the starting position
-        start = Node(state=self.start, parent=None, action=None)
-        frontier = StackFrontier()
-        frontier.add(start)
-
-        # Initialize an empty explored set
-        self.explored = set()
-
-        # Keep looping until solution found
-        while True:
-
-            # If nothing left in frontier, then no path
-            if frontier.check_empty():
-                raise Exception("no solution")
-
-            # Choose a node from the frontier
-            node = frontier.remove()
-            self.num_explored += 1
-
-            # If node is the goal, then we have a solution
-            if node.state == self.goal:
-                actions = []
-                cells = []
-                while node.parent is not None:
-                    actions.append(node.action)
-                    cells.append(node.state)
-                    node = node.parent
-                actions.reverse()
-                cells.reverse()
-                self.solution = (actions, cells)
-                return
-
-            # Mark node as explored
-            self.explored.add(node.state)
-
-            # Add neighbors to frontier
-            for action, result_state in self.neighbors(node.state):
-                if not frontier.contains_state(result_state) and result_state not in self.explored:
-                    child = Node(state=result_state, parent=node, action=action)
-                    frontier.add(child)
+        # 'self.status' has the status byte of every cell after searching, see 'EXPLORED'
+        path, self.status, self.num_explored = search_grid(
+            self.initial_status, self.height, self.width, self.start, self.goal
+        )
+
+        actions = [MOVES[move][0] for move, _ in path]
+        cells = [divmod(cell, self.width) for _, cell in path]
+        self.solution = (actions, cells)
     
     def output_image(self, filename, show_solution=True, show_explored=False):
         from PIL import Image, ImageDraw
         cell_size = 50
         cell_border = 2
 
-        # Create a blank canvas
-        img = Image.new(
-            "RGBA",
-            (self.width * cell_size, self.height * cell_size),
-            "black"
-        )
-        draw = ImageDraw.Draw(img)
-
-        solution = self.solution[1] if self.solution is not None else None
-        for i, row in enumerate(self.walls):
-            for j, col in enumerate(row):
-
-                # Walls
-                if col:
-                    fill = (40, 40, 40)
-
-                # Start
-                elif (i, j) == self.start:
-                    fill = (255, 0, 0)
-
-                # Goal
-                elif (i, j) == self.goal:
-                    fill = (0, 171, 28)
-
-                # Solution
-                elif solution is not None and show_solution and (i, j) in solution:
-                    fill = (220, 235, 113)
-
-                # Explored
-                elif solution is not None and show_explored and (i, j) in self.explored:
-                    fill = (212, 97, 85)
+        wall_color = (40, 40, 40, 255)
+        start_color = (255, 0, 0, 255)
+        goal_color = (0, 171, 28, 255)
+        solution_color = (220, 235, 113, 255)
+        explored_color = (212, 97, 85, 255)
+        empty_color = (237, 240, 252, 255)
 
-                # Empty cell
-                else:
-                    fill = (237, 240, 252)
-
-                # Draw cell
-                draw.rectangle(
-                    ([(j * cell_size + cell_border, i * cell_size + cell_border),
-                      ((j + 1) * cell_size - cell_border, (i + 1) * cell_size - cell_border)]),
-                    fill=fill
-                )
+        """
+            Rather than drawing a rectangle for every cell, we first work out the color of
+            every cell in a list (one item per cell, in the same order as the cell numbers).
+            Walls and explored cells come straight from the status bytes, and then we paint
+            the few cells of the solution, the start and the goal on top.
+        """
+        explored = EXPLORED if self.solution is not None and show_explored else 0
+        colors = [
+            wall_color if wall else explored_color if status & explored else empty_color
+            for wall, status in zip(self.initial_status, self.status)
+        ]
+        if self.solution is not None and show_solution:
+            for i, j in self.solution[1]:
+                colors[i * self.width + j] = solution_color
+        colors[self.start[0] * self.width + self.start[1]] = start_color
+        colors[self.goal[0] * self.width + self.goal[1]] = goal_color
+
+        # An image with a single pixel per cell, which we then scale up so that every
+        # cell becomes a square of 'cell_size' pixels.
+        img = Image.new("RGBA", (self.width, self.height))
+        img.putdata(colors)
+        img = img.resize((self.width * cell_size, self.height * cell_size), Image.NEAREST)
+
+        # Draw the black borders between the cells as one line per row and column
+        # instead of one per cell.
+        draw = ImageDraw.Draw(img)
+        for j in range(self.width + 1):
+            x = j * cell_size
+            draw.rectangle([(x - cell_border + 1, 0), (x + cell_border - 1, img.height)], fill="black")
+        for i in range(self.height + 1):
+            y = i * cell_size
+            draw.rectangle([(0, y - cell_border + 1), (img.width, y + cell_border - 1)], fill="black")
 
         img.save(filename)
 
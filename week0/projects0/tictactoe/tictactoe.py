@@ -3,12 +3,38 @@ Tic Tac Toe Player
 """
 
 import math
-import copy
+from functools import lru_cache
 
 X = "X"
 O = "O"
 EMPTY = None
 
+"""
+    Internally, we represent a board as a pair of 9-bit numbers (bitmasks),
+    one for the tiles taken by X and one for the tiles taken by O. The tile
+    (i, j) is the bit number 3 * i + j, so the board
+
+        X | O |
+        --+---+--
+          | X |
+        --+---+--
+          |   | O
+
+    becomes x_mask = 0b000010001 and o_mask = 0b100000010.
+
+    This way, counting the moves of a player is counting the 1 bits,
+    the empty tiles are the bits that are in neither mask, and checking
+    a winning line is a single '&' against the mask of that line.
+"""
+FULL_BOARD = 0b111111111
+
+# The eight possible lines: three rows, three columns and two diagonals
+LINES = (
+    0b000000111, 0b000111000, 0b111000000,
+    0b001001001, 0b010010010, 0b100100100,
+    0b100010001, 0b001010100,
+)
+
 
 def initial_state():
     """
@@ -19,39 +45,47 @@ def initial_state():
             [EMPTY, EMPTY, EMPTY]]
 
 
+def to_masks(board):
+    """
+    Returns the (x_mask, o_mask) pair representing the board.
+    """
+    x_mask = 0
+    o_mask = 0
+    for i, row in enumerate(board):
+        for j, col in enumerate(row):
+            if col == X:
+                x_mask |= 1 << (3 * i + j)
+            elif col == O:
+                o_mask |= 1 << (3 * i + j)
+    return x_mask, o_mask
+
+
 def player(board):
     """
     Returns player who has the next turn on a board.
     """
+    return player_bits(*to_masks(board))
+
 
-    """ 
-        The idea I'll implement is that we will check 
+def player_bits(x_mask, o_mask):
+    """
+        The idea I'll implement is that we will check
         how many moves have been made so far. Technically, a human
-        would consider three scenarios: 
+        would consider three scenarios:
             1 - If board is empty, then it would say it's turn of X
             2 - if board is not empty, it would count number of Xs and Os,
             reasoning that if Xs are equal to 0s then, it's X's turn as the first player.
             If not, it would be then 0's turn.
             3 - If board is full, then it's no one's turn. The game is over.
     """
-    num_x_played = 0
-    num_o_played = 0
-    num_empty = 0
-    # Counting what's happening on the board
-    for row in board:
-        for col in row:
-            if col == "X":
-                num_x_played += 1
-            elif col == "O":
-                num_o_played += 1
-            else:
-                num_empty += 1
-    
+    num_x_played = x_mask.bit_count()
+    num_o_played = o_mask.bit_count()
+
     # The reasoning
     if num_x_played == num_o_played:
-        # If the board is not full, then equality of Xs and 0s 
+        # If the board is not full, then equality of Xs and 0s
         # should mean that X will play since X is the first mover.
-        if not num_empty == 0:
+        if (x_mask | o_mask) != FULL_BOARD:
             return X
         else:
             # Basically, it should be no one's turn.
@@ -70,17 +104,16 @@ def actions(board):
     """
     Returns set of all possible actions (i, j) available on the board.
     """
+    return {divmod(tile, 3) for tile in empty_tiles(*to_masks(board))}
 
-    # Creating the set
-    possible_actions = set()
-    
-    # Using enumerate as I need to access the index of the tile along with its value
-    for i, row in enumerate(board):
-        for j, col in enumerate(row):
-            if col == EMPTY:
-                possible_actions.add((i, j))
-    
-    return possible_actions
+
+def empty_tiles(x_mask, o_mask):
+    """
+        Returns the bit numbers of the empty tiles, i.e. the bits
+        that are set in neither mask.
+    """
+    empty = ~(x_mask | o_mask) & FULL_BOARD
+    return [tile for tile in range(9) if empty >> tile & 1]
 
 
 def result(board, action):
@@ -90,19 +123,20 @@ def result(board, action):
 
     # Understanding the current player for the given board
     current_move = player(board)
-    # Making a deep copy of the original board
+    # Making a copy of each row of the original board
     """
-        We are making a copy instead of editing the board itself as 
+        We are making a copy instead of editing the board itself as
         we still want to have access to the old board. We will store this
         in the search problem with minimax as we store the parent, the board
         that led to the new board.
 
-        We want to make a deep copy as opposed to a shallow copy since
-        a shallow copy (copy.copy(board)) would keep the refrences of the 
-        items within the list, meaning that if we make changes to the items
-        in the copy, it would change the items in the original list.
+        A shallow copy (copy.copy(board)) would not be enough since it would
+        keep the references of the rows within the list, meaning that if we make
+        changes to a row in the copy, it would change the row in the original list.
+        We don't need 'copy.deepcopy' either: the tiles themselves are just "X", "O"
+        or None, which never change, so copying each row is enough and much faster.
     """
-    new_board = copy.deepcopy(board)
+    new_board = [row[:] for row in board]
 
     # Getting the indices of the action with double assignment
     action_row, action_column = action
@@ -111,38 +145,39 @@ def result(board, action):
     new_board[action_row][action_column] = current_move
 
     return new_board
-    
+
+
+def result_bits(x_mask, o_mask, tile):
+    """
+        Same as 'result' but on masks. Since numbers are immutable,
+        setting the bit of the tile gives us a new board without
+        copying anything.
+    """
+    if player_bits(x_mask, o_mask) == X:
+        return x_mask | 1 << tile, o_mask
+    return x_mask, o_mask | 1 << tile
+
 
 def winner(board):
     """
     Returns the winner of the game, if there is one.
     """
+    return winner_bits(*to_masks(board))
+
 
+def winner_bits(x_mask, o_mask):
     """
-        So the idea is that there are eight possible scenarios where
-        if all the values are 'X' then X player wins or if they are all
-        'O' then 'O' player wins. 
+        So the idea is that there are eight possible lines where
+        if all the tiles are 'X' then X player wins or if they are all
+        'O' then 'O' player wins. A player has all the tiles of a line
+        when its mask still contains the whole line after '&'.
     """
+    for line in LINES:
+        if x_mask & line == line:
+            return X
+        if o_mask & line == line:
+            return O
 
-    winning_states = [
-        [(0,0), (0, 1), (0, 2)],
-        [(0,0), (1, 0), (2, 0)],
-        [(0,0), (1, 1), (2, 2)],
-        [(0,1), (1, 1), (2, 1)],
-        [(0,2), (1, 1), (2, 0)],
-        [(0,2), (1, 2), (2, 2)],
-        [(1,0), (1, 1), (1, 2)],
-        [(2,0), (2, 1), (2, 2)],
-    ]
-
-    for state in winning_states:
-        tile0 = state[0]
-        tile1 = state[1]
-        tile2 = state[2]
-
-        if board[tile0[0]][tile0[1]] == board[tile1[0]][tile1[1]] == board[tile2[0]][tile2[1]] and board[tile0[0]][tile0[1]] is not EMPTY:
-            return board[tile0[0]][tile0[1]]
-    
     # No winning state has been found
     return None
 
@@ -151,114 +186,136 @@ def terminal(board):
     """
     Returns True if game is over, False otherwise.
     """
+    return terminal_bits(*to_masks(board))
 
-    # Let's first check if there is any winner. If yes, the game is over.
-    if winner(board) is not None:
-        return True
-    
-    """
-        Checks each section of the board to see if any is empty
-        This is assuming that boards are proper. We can add some 
-        validation here if we wanted but no need.
-    """
-    for row  in board:
-        for col in row:
-            if col == EMPTY:
-                # If any empty, then says there is still play to go
-                return False
-    # If no empty, returns true that game is over. 
-    return True
+
+def terminal_bits(x_mask, o_mask):
+    return terminal_and_utility_bits(x_mask, o_mask)[0]
 
 
 def utility(board):
     """
     Returns 1 if X has won the game, -1 if O has won, 0 otherwise.
     """
-    if winner(board) == 'X':
-        return 1
-    
-    elif winner(board) == "O":
-        return -1
-    
-    elif winner(board) == None:
-        return 0
+    return utility_bits(*to_masks(board))
 
-    else:
-        raise Exception("You might have called the utility function before the game is over.")
 
+def utility_bits(x_mask, o_mask):
+    return terminal_and_utility_bits(x_mask, o_mask)[1]
+
+
+def terminal_and_utility_bits(x_mask, o_mask):
+    """
+        Minimax needs to know both whether the game is over and, if so,
+        who won. Both come from the same check of the eight lines, so we
+        look at the lines only once and return a (terminal, utility) pair.
+    """
+    winner = winner_bits(x_mask, o_mask)
+
+    # Let's first check if there is any winner. If yes, the game is over.
+    if winner == X:
+        return True, 1
+    if winner == O:
+        return True, -1
+
+    # If no winner, the game is over (as a draw) only when every tile has been played.
+    return (x_mask | o_mask) == FULL_BOARD, 0
+
+"""
+    Different orders of moves can lead to the same board, e.g. X in the corner then
+    O in the middle and X in the other corner ends up the same as starting with the
+    other corner. Since a board is now just a pair of numbers, we can remember
+    (memoize) the answer for every board we have already solved with 'lru_cache'
+    instead of searching it again. There are only 5478 possible boards, so the cache
+    never needs to forget anything and can be kept from one game to the next.
+
+    Both functions return a (value, move) tuple so that the move is remembered too.
+
+    Alpha-Beta Pruning: 'alpha' is the best value that the 'X' player is already
+    guaranteed somewhere up the tree and 'beta' is the best value that the 'O' player
+    is already guaranteed. Once alpha >= beta, the player above us would never let
+    the game reach this board, so there is no point in looking at the remaining actions.
+
+    Note that we compare against the bounds themselves rather than checking whether
+    they are set, since 0 (a draw) is a perfectly valid bound in tic-tac-toe. The
+    bounds are part of what 'lru_cache' remembers, so a value found with some bounds
+    is only reused with the same bounds.
+"""
 # This is how the 'X' player is thinking, trying to maximize the value.
-def max_value(board, min_val_seen=None, provide_move=False):
+@lru_cache(maxsize=None)
+def max_value(x_mask, o_mask, alpha=-math.inf, beta=math.inf):
     # We need this to break out of the recursive once we get to the end of the game
-    if terminal(board):
-        return utility(board)
-    
+    game_over, value = terminal_and_utility_bits(x_mask, o_mask)
+    if game_over:
+        return value, None
+
     # Assigning negative infinity to max value so that we know that every value
     # will be larger than this in the first place.
-    max_val_seen = float("-inf")
+    max_val_seen = -math.inf
     best_action = None
 
     # Looping over all the possible actions to see what board we might get and
     # then seeing what would be the minimum value of that board that our opponent
     # might want to take advantage of.
-    for action in actions(board):
-        highest_value_possible = min_value(result(board, action), max_val_seen=max_val_seen)
-
-        # Allows Alpha-Beta Pruning
-        if  min_val_seen and highest_value_possible > min_val_seen:
-            return highest_value_possible
+    for tile in empty_tiles(x_mask, o_mask):
+        highest_value_possible, _ = min_value(*result_bits(x_mask, o_mask, tile), alpha, beta)
 
         if highest_value_possible > max_val_seen:
             max_val_seen = highest_value_possible
-            best_action = action
+            best_action = divmod(tile, 3)
 
-    # I've added this bit as a prop to turn on and off when needed.
-    if provide_move:
-        return best_action
-    else:
-        return max_val_seen
+        # Allows Alpha-Beta Pruning
+        alpha = max(alpha, highest_value_possible)
+        if alpha >= beta:
+            break
+
+    return max_val_seen, best_action
 
 
 # Basically, this function is how the 'O' player is thinking, trying to minimize the value.
-def min_value(board, max_val_seen=None, provide_move=False):
-    if terminal(board):
-        return utility(board)
+@lru_cache(maxsize=None)
+def min_value(x_mask, o_mask, alpha=-math.inf, beta=math.inf):
+    game_over, value = terminal_and_utility_bits(x_mask, o_mask)
+    if game_over:
+        return value, None
 
-    # Assigning positive infinity to current value, which allows us to be impartial to all the 
+    # Assigning positive infinity to current value, which allows us to be impartial to all the
     # possible actions.
-    min_val_seen = float("inf")
+    min_val_seen = math.inf
     best_action = None
 
-    for action in actions(board):
-        lowest_value_possible = max_value(result(board, action), min_val_seen=min_val_seen)
-    
-        # Allows Alpha-Beta Pruning
-        if max_val_seen and lowest_value_possible < max_val_seen:
-            return lowest_value_possible
+    for tile in empty_tiles(x_mask, o_mask):
+        lowest_value_possible, _ = max_value(*result_bits(x_mask, o_mask, tile), alpha, beta)
 
         if lowest_value_possible < min_val_seen:
             min_val_seen = lowest_value_possible
-            best_action = action
-    
-    if provide_move:
-        return best_action
-    else:
-        return min_val_seen
+            best_action = divmod(tile, 3)
+
+        # Allows Alpha-Beta Pruning
+        beta = min(beta, lowest_value_possible)
+        if alpha >= beta:
+            break
+
+    return min_val_seen, best_action
 
 
 def minimax(board):
     """
     Returns the optimal action for the current player on the board.
     """
+    # We convert the board to masks once and search over the masks from there on.
+    x_mask, o_mask = to_masks(board)
 
     # Let's return none before doing any hard work if the game is already over
-    if terminal(board):
+    if terminal_bits(x_mask, o_mask):
         return None
 
     # We need to know if AI is the X or O player to know what value to maximize.
-    if player(board) == 'X':
-        return max_value(board, provide_move=True)
+    # The second item of the returned tuple is the move.
+    if player_bits(x_mask, o_mask) == 'X':
+        return max_value(x_mask, o_mask)[1]
+
 
-        
     # We need to know if AI is the X or O player to know what value to maximize.
-    if player(board) == 'O':
-        return min_value(board, provide_move=True)
+    if player_bits(x_mask, o_mask) == 'O':
+        return min_value(x_mask, o_mask)[1]
@@ -20,14 +20,129 @@ weapons = [knife, revolver, wrench]
 symbols = characters + rooms + weapons
 
 
+# Instead of going through every possible model with model_check, we turn the
+# knowledge into clauses (ORs of symbols or negated symbols) and ask a small
+# DPLL solver whether they can all be true. Each symbol is numbered from 1 and
+# a literal is that number, negative if the symbol is negated.
+def to_clauses(sentence, numbers):
+    """Returns the clauses of a sentence made of Ands of Ors of (negated) symbols."""
+    if isinstance(sentence, And):
+        return [
+            clause
+            for conjunct in sentence.conjuncts
+            for clause in to_clauses(conjunct, numbers)
+        ]
+    if isinstance(sentence, Or):
+        # Each disjunct has to be a single clause itself, i.e. a (negated)
+        # symbol or another Or. Something like Or(a, And(b, c)) would need a
+        # real CNF conversion, so we refuse it rather than answer wrongly.
+        literals = []
+        for disjunct in sentence.disjuncts:
+            if not isinstance(disjunct, (Or, Symbol, Not)):
+                raise TypeError(f"cannot turn {sentence} into clauses")
+            clauses = to_clauses(disjunct, numbers)
+            if len(clauses) != 1:
+                raise TypeError(f"cannot turn {sentence} into clauses")
+            literals.extend(clauses[0])
+        return [literals]
+    if isinstance(sentence, Symbol):
+        return [[numbers.setdefault(sentence.name, len(numbers) + 1)]]
+    if isinstance(sentence, Not) and isinstance(sentence.operand, Symbol):
+        return [[-numbers.setdefault(sentence.operand.name, len(numbers) + 1)]]
+    raise TypeError(f"cannot turn {sentence} into clauses")
+
+
+def find_model(clauses, assumptions=()):
+    """
+    Returns a set of true literals that makes all the clauses true while the
+    assumed literals are true, or None if there is no such model. Symbols whose
+    literal is in the set neither way can be either true or false.
+    """
+    true_literals = set(assumptions)
+    while True:
+        remaining = []
+        units = []
+        for clause in clauses:
+            # A clause with a true literal is already satisfied
+            if any(literal in true_literals for literal in clause):
+                continue
+            # Drop the literals that are already false
+            clause = [literal for literal in clause if -literal not in true_literals]
+            if not clause:
+                return None
+            if len(clause) == 1:
+                units.append(clause[0])
+            remaining.append(clause)
+        if not remaining:
+            return true_literals
+        if not units:
+            break
+        # A clause with a single literal left forces that literal to be true
+        true_literals.update(units)
+        if any(-literal in true_literals for literal in units):
+            return None
+        clauses = remaining
+
+    # Nothing is forced anymore, so try both values of some literal
+    literal = remaining[0][0]
+    model = find_model(remaining, true_literals | {literal})
+    if model is None:
+        model = find_model(remaining, true_literals | {-literal})
+    return model
+
+
+def entailed_literals(knowledge, symbols):
+    """
+    Yields the name of each symbol with "YES" if knowledge entails it, "NO" if
+    knowledge entails its negation and "MAYBE" otherwise.
+    """
+    # We look up each symbol's name once and number the symbols we are asked
+    # about first, so that their literals are simply 1, 2, 3, ...
+    names = [symbol.name for symbol in symbols]
+    numbers = {}
+    literals = [numbers.setdefault(name, len(numbers) + 1) for name in names]
+    clauses = to_clauses(knowledge, numbers)
+
+    # Rather than asking the solver twice about every symbol, we remember the
+    # values each symbol took in the models we have found so far. A symbol that
+    # was both true and false in some model is a MAYBE without asking again.
+    values = {literal: set() for literal in literals}
+
+    def record(model):
+        for literal in literals:
+            if literal in model:
+                values[literal].add(True)
+            elif -literal in model:
+                values[literal].add(False)
+            else:
+                values[literal].update((True, False))
+
+    model = find_model(clauses)
+    if model is None:
+        # Knowledge that can never be true entails everything
+        for name in names:
+            yield name, "YES"
+        return
+    record(model)
+
+    for name, literal in zip(names, literals):
+        if len(values[literal]) == 1:
+            # The symbol only took one value so far, so look for a model with the other one
+            value = next(iter(values[literal]))
+            model = find_model(clauses, [-literal if value else literal])
+            if model is None:
+                yield name, "YES" if value else "NO"
+                continue
+            record(model)
+        yield name, "MAYBE"
+
+
 def check_knowledge(knowledge):
-    for symbol in symbols:
-        if model_check(knowledge, symbol):
-            termcolor.cprint(f"{symbol}: YES", "green")
-        # Checking whether the opposite is actually true and if not
-        # saying maybe
-        elif not model_check(knowledge, Not(symbol)):
-            print(f"{symbol}: MAYBE")
+    for name, answer in entailed_literals(knowledge, symbols):
+        if answer == "YES":
+            termcolor.cprint(f"{name}: YES", "green")
+        elif answer == "MAYBE":
+            print(f"{name}: MAYBE")
 
 
 # There must be a person, room, and weapon.
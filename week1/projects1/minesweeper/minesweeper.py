@@ -1,6 +1,42 @@
 import itertools
 import random
 
+# What 'known_mines' and 'known_safes' return when they don't know anything.
+# It is the same empty frozenset every time, so callers can always loop over
+# or take the union with the result instead of checking for None first.
+_EMPTY = frozenset()
+
+
+def set_bits(mask):
+    """
+        Yields the numbers of the bits that are set in a mask. 'mask & -mask'
+        is the lowest set bit, so we take that one out of the mask until
+        there are none left.
+    """
+    while mask:
+        lowest = mask & -mask
+        yield lowest.bit_length() - 1
+        mask ^= lowest
+
+
+def neighbor_masks(height, width):
+    """
+        Returns a list with, for every cell id i * width + j, the mask of the
+        cells within one row and column of that cell, not including the cell
+        itself. The board never changes size, so we check the bounds for
+        every cell once here instead of every time we need the neighbors.
+    """
+    masks = []
+    for i in range(height):
+        for j in range(width):
+            mask = 0
+            for row in range(max(i - 1, 0), min(i + 2, height)):
+                for col in range(max(j - 1, 0), min(j + 2, width)):
+                    if (row, col) != (i, j):
+                        mask |= 1 << (row * width + col)
+            masks.append(mask)
+    return masks
+
 
 class Minesweeper():
     """
@@ -12,36 +48,25 @@ class Minesweeper():
         # Set initial width, height, and number of mines
         self.height = height
         self.width = width
-        self.mines = set()
-
-        # Initialize an empty field with no mines
-        """ 
-            Basically, we are creating something like the below:
-            [
-                [False, False, False, False, False, False, False, False],
-                [False, False, False, False, False, False, False, False],
-                [False, False, False, False, False, False, False, False],
-                [False, False, False, False, False, False, False, False],
-                [False, False, False, False, False, False, False, False],
-                [False, False, False, False, False, False, False, False],
-                [False, False, False, False, False, False, False, False],
-                [False, False, False, False, False, False, False, False]
-            ]
-        """
-        self.board = []
-        for i in range(self.height):
-            row = []
-            for j in range(self.width):
-                row.append(False)
-            self.board.append(row)
 
         # Add mines randomly
-        while len(self.mines) != mines:
-            i = random.randrange(height)
-            j = random.randrange(width)
-            if not self.board[i][j]:
-                self.mines.add((i, j))
-                self.board[i][j] = True
+        """
+            Instead of a list of lists of True/False for every cell of the board,
+            we keep the mines as a single mask over the cell ids i * width + j
+            (see MinesweeperAI): the bit number i * width + j is set when there
+            is a mine in the cell (i, j). Setting a bit that is already set
+            changes nothing, so we can keep picking random cells until there are
+            as many bits set as there are mines.
+        """
+        self.mine_mask = 0
+        while self.mine_mask.bit_count() != mines:
+            self.mine_mask |= 1 << random.randrange(height * width)
+
+        # The runner compares the flags with the set of (i, j) mines
+        self.mines = {divmod(cell_id, width) for cell_id in set_bits(self.mine_mask)}
+
+        # The neighbors of every cell
+        self.neighbor_mask = neighbor_masks(height, width)
 
         # At first, player has found no mines
         self.mines_found = set()
@@ -54,7 +79,7 @@ class Minesweeper():
         for i in range(self.height):
             print("--" * self.width + "-")
             for j in range(self.width):
-                if self.board[i][j]:
+                if self.is_mine((i, j)):
                     print("|X", end="")
                 else:
                     print("| ", end="")
@@ -63,7 +88,7 @@ class Minesweeper():
 
     def is_mine(self, cell):
         i, j = cell
-        return self.board[i][j]
+        return bool(self.mine_mask >> (i * self.width + j) & 1)
 
     def nearby_mines(self, cell):
         """
@@ -72,29 +97,9 @@ class Minesweeper():
         not including the cell itself.
         """
 
-        # Keep count of nearby mines
-        count = 0
-
-        # Loop over all cells within one row and column
-        # Accessing the column. We add 2 since we are using range function.
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
-
-                # Ignore the cell itself
-                if (i, j) == cell:
-                    continue
-
-                # Update count if cell in bounds and is mine
-                """ 
-                    Interesting implementation. It checks if it is
-                    within bounds along with the mine check, probably
-                    for terseness.
-                """
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    if self.board[i][j]:
-                        count += 1
-
-        return count
+        # The mines among the neighbors are the bits set in both masks.
+        i, j = cell
+        return (self.mine_mask & self.neighbor_mask[i * self.width + j]).bit_count()
 
     def won(self):
         """
@@ -112,17 +117,22 @@ class Sentence():
 
     A cell is represented by the tuple (i,j) where i is the row 
     and j is the column of the mine field.
+
+    The cells are kept in a frozenset so that a sentence can be hashed by
+    both its cells and its count. Hashing by the count alone would put every
+    sentence with the same count in the same bucket of a set or dictionary,
+    and hashing a mutable set would not be safe at all.
     """
 
     def __init__(self, cells, count):
-        self.cells = set(cells)
+        self.cells = frozenset(cells)
         self.count = count
 
     def __eq__(self, other):
         return self.cells == other.cells and self.count == other.count
     
     def __hash__(self):
-        return hash(self.count)
+        return hash((self.cells, self.count))
 
     def __str__(self):
         return f"{self.cells} = {self.count}"
@@ -137,6 +147,7 @@ class Sentence():
         
         if self.count == len(self.cells):
             return self.cells
+        return _EMPTY
 
     def known_safes(self):
         """
@@ -144,6 +155,7 @@ class Sentence():
         """
         if self.count == 0:
             return self.cells
+        return _EMPTY
 
     def mark_mine(self, cell):
         """
@@ -155,7 +167,7 @@ class Sentence():
         one since the count is about the number of mines.
         """
         if cell in self.cells:
-            self.cells.remove(cell)
+            self.cells = self.cells - {cell}
             # We can do some edge case checking in case there is a sentence that
             # has a count of 0 but has a mine it in but let's not in this case.
             self.count -= 1
@@ -170,7 +182,7 @@ class Sentence():
         mines within those cells. 
         """
         if cell in self.cells:
-            self.cells.remove(cell)
+            self.cells = self.cells - {cell}
 
 
 class MinesweeperAI():
@@ -184,24 +196,103 @@ class MinesweeperAI():
         self.height = height
         self.width = width
 
+        # The neighbors of every cell, as masks over the cell ids (see below)
+        self.neighbor_mask = neighbor_masks(height, width)
+
         # Keep track of which cells have been clicked on
         self.moves_made = set()
 
-        # Keep track of cells known to be safe or mines
+        # The mask of the cells we could still pick for a random move
+        self.available = (1 << (height * width)) - 1
+
+        # Keep track of cells known to be safe or mines, both as sets of (i, j)
+        # cells and as masks over the cell ids
         self.mines = set()
         self.safes = set()
+        self.mines_mask = 0
+        self.safes_mask = 0
+
+        # Sentences about the game known to be true
+        """
+            Inside the knowledge base, we don't use (i, j) tuples for cells.
+            Every cell gets a number, its id, i * width + j, so that a group of
+            cells can be a single number (a bitmask) where the bit number id is
+            set when the cell is in the group. Checking if a group is a subset of
+            another one or taking the difference of two groups is then a single
+            '&' instead of going over the cells one by one.
+
+            The knowledge is a dictionary from the cells of a sentence (as a mask)
+            to its count. This way, the same cells are never stored twice and
+            checking if we already know a sentence is a single lookup.
+
+            'by_cell' maps every cell id to the masks of the sentences that contain
+            it, so we can find the sentences that a cell affects without going
+            over the whole knowledge base.
+        """
+        self.knowledge = dict()
+        self.by_cell = dict()
+
+        # The sentences added since the last time we looked for subsets (step 5)
+        self.new_sentences = set()
 
-        # List of sentences about the game known to be true
-        self.knowledge = []
+        # The sentences added since the last time we looked for safes and mines (step 4)
+        self.to_check = set()
+
+    def cell_id(self, cell):
+        """
+            Returns the id of the (i, j) cell.
+        """
+        return cell[0] * self.width + cell[1]
+
+    def cells_of(self, mask):
+        """
+            Yields the (i, j) cells in a mask.
+        """
+        for cell_id in set_bits(mask):
+            yield divmod(cell_id, self.width)
+
+    def add_sentence(self, cells, count):
+        """
+            Adds the sentence 'cells = count' to the knowledge base, unless
+            it has no cells (then it tells us nothing) or we already know it.
+        """
+        if not cells or cells in self.knowledge:
+            return
+        self.knowledge[cells] = count
+        self.new_sentences.add(cells)
+        self.to_check.add(cells)
+        for cell_id in set_bits(cells):
+            self.by_cell.setdefault(cell_id, set()).add(cells)
+
+    def remove_sentence(self, cells):
+        """
+            Removes the sentence with the given cells from the knowledge base
+            and returns its count.
+        """
+        count = self.knowledge.pop(cells)
+        self.new_sentences.discard(cells)
+        self.to_check.discard(cells)
+        for cell_id in set_bits(cells):
+            sentences = self.by_cell.get(cell_id)
+            if sentences is not None:
+                sentences.discard(cells)
+        return count
 
     def mark_mine(self, cell):
         """
         Marks a cell as a mine, and updates all knowledge
         to mark that cell as a mine as well.
+
+        Since the cells of a sentence are its key, we take out every sentence
+        that contains the cell and put it back without the cell.
         """
         self.mines.add(cell)
-        for sentence in self.knowledge:
-            sentence.mark_mine(cell)
+        cell_id = self.cell_id(cell)
+        self.mines_mask |= 1 << cell_id
+        self.available &= ~(1 << cell_id)
+        for cells in self.by_cell.pop(cell_id, ()):
+            count = self.remove_sentence(cells)
+            self.add_sentence(cells & ~(1 << cell_id), count - 1)
 
     def mark_safe(self, cell):
         """
@@ -209,8 +300,11 @@ class MinesweeperAI():
         to mark that cell as safe as well.
         """
         self.safes.add(cell)
-        for sentence in self.knowledge:
-            sentence.mark_safe(cell)
+        cell_id = self.cell_id(cell)
+        self.safes_mask |= 1 << cell_id
+        for cells in self.by_cell.pop(cell_id, ()):
+            count = self.remove_sentence(cells)
+            self.add_sentence(cells & ~(1 << cell_id), count)
 
     def get_neighbors(self, cell):
         """
@@ -220,22 +314,8 @@ class MinesweeperAI():
             "Minesweeper.nearby_mines" to get all the cells
             that are neighbors of a specific cell.
         """
-        # Defining an empty set for neighbors
-        neighbors = set()
-
-        for i in range(cell[0] - 1, cell[0] + 2):        
-            for j in range(cell[1] - 1, cell[1] + 2):
-
-                # Ignore the cell itself
-                if (i, j) == cell:
-                    continue
-                
-                # Make sure that cell is in bounds
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    # Add the neigh 
-                    neighbors.add((i, j))
-
-        return neighbors
+        # We look the neighbors up in the table we made at the start.
+        return set(self.cells_of(self.neighbor_mask[self.cell_id(cell)]))
 
     def add_knowledge(self, cell, count):
         """
@@ -255,121 +335,114 @@ class MinesweeperAI():
 
         ## Step 1: Add the cell to the moves made
         self.moves_made.add(cell)
+        self.available &= ~(1 << self.cell_id(cell))
 
 
-        ## Step 2: 
-        #  2.1 - Mark the cell as safe by adding it to AI's knowledge
-        self.safes.add(cell)
+        ## Step 2: Mark the cell as safe, which also updates the sentences in our knowledge base
+        self.mark_safe(cell)
 
-        #  2.2 - looping over sentences in our database to update them accordingly.
-        for sentence in self.knowledge:
-            sentence.mark_safe(cell)
-        
 
         ## Step 3
         #  3.1 - Get the neighbors of the given cell
-        neigbors = self.get_neighbors(cell)
+        neigbors = self.neighbor_mask[self.cell_id(cell)]
 
-        # 3.2 - Create an initial sentence with the neighbors and count
-        new_sentence = Sentence(neigbors, count)
+        # 3.2 - Remove the known safe cells and mines from the neighbors. The known mines
+        # among them no longer count for the sentence either.
+        new_cells = neigbors & ~(self.safes_mask | self.mines_mask)
+        new_count = count - (neigbors & self.mines_mask).bit_count()
 
-        # 3.3 - Remove the known safe cells from the sentence
-        for safe_cell in self.safes:
-            new_sentence.mark_safe(safe_cell)
-
-        # 3.4 - Remove the known mines from the sentence
-        for mine in self.mines:
-            new_sentence.mark_mine(mine)
+        # 3.3 - Now that we have a clean sentence, let's add that to the knowledge base
+        self.add_sentence(new_cells, new_count)
 
-        # 3.5 - Now that we have a clean sentence, let's append that to the knowledge base
-        self.knowledge.append(new_sentence)
 
+        """
+            Steps 4 and 5 feed each other: the safes and mines we find in step 4
+            change the sentences that contain them, and the sentences we infer
+            in step 5 can tell us about more safes and mines. So we repeat them
+            until step 5 has nothing new to add, instead of leaving what is left
+            for the next move.
+        """
+        while True:
 
-        ## Step 4
-        # 4.1 - Create a larger set of safes and mines for potential infers from KB
-        inferred_safes = set()
-        inferred_mines = set()
-        
-        # 4.2  - Once we find any known safes or mines, we want to remove that sentence
-        # since that sentence loses its use for us.
-        sentences_to_remove = set()
-
-        # 4.3 - Get any existing inferments we can make from existing KB
-        for sentence in self.knowledge:
-            # Grabbing the known safes and mines
-            known_safes = sentence.known_safes()
-            known_mines = sentence.known_mines()
-            
-            # Checking if any safes or mines were returned
-            if known_safes:
-                for known_safe in known_safes:
-                    inferred_safes.add(known_safe)
-                sentences_to_remove.add(sentence)
-
-            if known_mines:
-                for known_mine in known_mines:
-                    inferred_mines.add(known_mine)
-                sentences_to_remove.add(sentence)
-
-        # 4.4 - Add the new information to AI's knowledge
-        if len(inferred_safes) > 0:
-            for safe in inferred_safes:
-                self.safes.add(safe)
-        
-        if len(inferred_mines) > 0:
-            for mine in inferred_mines:
-                self.mines.add(mine)
-
-        # 4.5 - Removing the sentences who served their purpose
-        if len(sentences_to_remove) > 0:
-            for sentence in sentences_to_remove:
-                self.knowledge.remove(sentence)
-
-
-        ## Step 5
-        # 5.1 - Let's create a new set that will contain all the subsets we can infer
-        subsets = set()
-        sentences_to_add = set()
-
-        # 5.2 - Let's loop over all our knowledge and see what we can get from our KB
-        KB = self.knowledge
-        for i in range(len(KB)):
-            for j in range(i+1, len(KB)):
-                # Checking if cells of sentence i form subset of cells of sentence j
-                if KB[i].cells.issubset(KB[j].cells):
-                    subsets.add((i, j))
-                # Checking if cells of sentence j form subset of cells of sentence i
-                elif KB[i].cells.issuperset(KB[j].cells):
-                    subsets.add((j, i))
-
-        # 5.3 - Once we have all the subsets, let's construct some new knowledge
-        if len(subsets) > 0:
-            for subset in subsets:
-                i, j = subset
-                """ 
-                    We are using the '-' method instead of 'difference_update' since
-                    that method creates a new set without modifying the original sets.
-
-                    We can also just work with indices because knowledge is a list, 
-                    not a set which means that it is ordered and indices matter.
-                """
-                new_cells = KB[j].cells - KB[i].cells
-                new_count = KB[j].count - KB[i].count
-
-                if new_count < 0:
-                    print(KB[i])
-                    print(KB[j])
-                    raise Exception("Something is wrong with the subsets. Check Minesweeper, line 360")
-                
-                new_sentence = Sentence(new_cells, new_count)
-                
-                # Best not to add this to KB as we are working with KB
-                sentences_to_add.add(new_sentence)
-        
-        # 5.4 - Let's add all the sentences we got to our KB
-        if len(sentences_to_add) > 0:
-            for sentence in sentences_to_add:
-                KB.append(sentence)
+            ## Step 4
+            """
+                A sentence can only tell us something new when it has just been added,
+                and marking a cell takes a sentence out and adds it back under its new
+                cells. So instead of going over the whole knowledge base, we go over
+                'to_check', the sentences added since we last got here. Marking cells
+                adds the sentences it changes to 'to_check', so we keep going until
+                it is empty.
+            """
+            while self.to_check:
+                cells = self.to_check.pop()
+                cells_count = self.knowledge[cells]
+
+                # A sentence with a count of 0 only has safe cells and a sentence with
+                # as many mines as cells only has mines. Marking the cells also removes
+                # them from every sentence, so the sentences who served their purpose
+                # end up with no cells and are dropped.
+                if cells_count == 0:
+                    for safe in self.cells_of(cells):
+                        self.mark_safe(safe)
+                elif cells_count == cells.bit_count():
+                    for mine in self.cells_of(cells):
+                        self.mark_mine(mine)
+
+
+            ## Step 5
+            # 5.1 - Let's create a new dictionary for the sentences we can infer
+            sentences_to_add = dict()
+
+            """
+                Two sentences that were already in the knowledge base the last time we
+                got here have already been compared, and whatever they gave us is either
+                still in the knowledge base or has been used up. Marking a cell takes a
+                sentence out and puts it back under new cells, so a sentence that changed
+                counts as new too. That means we only need the pairs where at least one
+                of the two sentences is new.
+            """
+            new_sentences = self.new_sentences
+            self.new_sentences = set()
+
+            # 5.2 - Let's loop over all our knowledge and see what we can get from our KB
+            """
+                If the cells of a sentence A are a subset of the cells of a sentence B,
+                then B - A has B's count minus A's count mines.
+
+                A sentence contains A when it is listed in 'by_cell' for every one of A's
+                cells, so instead of comparing every pair of sentences, we intersect those
+                lists. We start from the shortest one, which is usually just a handful of
+                sentences, so the intersection stays small from the beginning.
+            """
+            for cells, cells_count in self.knowledge.items():
+                sentence_lists = sorted((self.by_cell[cell_id] for cell_id in set_bits(cells)), key=len)
+                supersets = sentence_lists[0].intersection(*sentence_lists[1:])
+
+                # The same cells would tell us nothing new, so we skip those.
+                supersets.discard(cells)
+
+                # We have already compared two old sentences before.
+                if cells not in new_sentences:
+                    supersets &= new_sentences
+
+                for other in supersets:
+                    new_count = self.knowledge[other] - cells_count
+
+                    if new_count < 0:
+                        print(f"{set(self.cells_of(cells))} = {cells_count}")
+                        print(f"{set(self.cells_of(other))} = {self.knowledge[other]}")
+                        raise Exception("Something is wrong with the subsets. Check Minesweeper, step 5")
+
+                    # Best not to add this to KB as we are working with KB
+                    sentences_to_add[other & ~cells] = new_count
+
+            # 5.3 - Let's add all the sentences we got to our KB
+            for cells, cells_count in sentences_to_add.items():
+                self.add_sentence(cells, cells_count)
+
+            # If none of them were new, there is nothing left to infer.
+            if not self.to_check:
+                break
 
     def make_safe_move(self):
         """
@@ -395,31 +468,18 @@ class MinesweeperAI():
             1) have not already been chosen, and
             2) are not known to be mines
         """
-        # Let's get board height and width
-        board_height = self.height
-        board_width = self.width
-        
-        # This will help break out of the loop. We are getting
-        # max loop possible
-        moves_available = board_height * board_width
-        
-        # Let's keep doing it until we break out of the loop
-        while True:
-            # Let's select a random move
-            i = random.randrange(board_height)
-            j = random.randrange(board_width)
-            random_move = (i, j)
-
-            # Let's return it if it's not been chosen yet or
-            # it is not a mine.
-            if random_move not in self.moves_made and random_move not in self.mines:
-                return random_move
-            else:
-                # Reducing a move checked from the maximum moves possible
-                moves_available -= 1
-            
-            # If no more moves are left, exiting the loop.
-            if moves_available == 0:
-                return None
-            
-                
\ No newline at end of file
+        """
+            Instead of picking random cells until we find one that we can play,
+            which takes longer and longer as the board fills up, we keep the mask
+            'available' of the cells that are neither moves made nor known mines
+            and pick one of its set bits at random.
+        """
+        moves_available = self.available.bit_count()
+
+        # If no more moves are left, there is nothing to return.
+        if moves_available == 0:
+            return None
+
+        # Let's skip a random number of the available cells and take the next one.
+        cell_id = next(itertools.islice(set_bits(self.available), random.randrange(moves_available), None))
+        return divmod(cell_id, self.width)
@@ -36,6 +36,68 @@ PROBS = {
 }
 
 
+"""
+    PASS[genes] is the probability that a parent with 'genes' copies of the gene
+    passes it to their child. A parent with two copies passes it unless it
+    mutates, a parent with one copy passes it half of the time and a parent with
+    no copies can only pass it if it mutates.
+"""
+PASS = {
+    0: PROBS["mutation"],
+    1: 0.5,
+    2: 1 - PROBS["mutation"]
+}
+
+"""
+    CHILD_GENE_PROB[genes][mother_genes][father_genes] is the probability that a
+    child ends up with 'genes' copies of the gene given how many copies the
+    mother and the father have:
+        2 genes - both of them pass the gene,
+        1 gene  - exactly one of them passes it,
+        0 genes - neither of them passes it.
+"""
+CHILD_GENE_PROB = [
+    [[(1 - PASS[mother]) * (1 - PASS[father]) for father in range(3)] for mother in range(3)],
+    [[PASS[mother] * (1 - PASS[father]) + (1 - PASS[mother]) * PASS[father]
+      for father in range(3)] for mother in range(3)],
+    [[PASS[mother] * PASS[father] for father in range(3)] for mother in range(3)]
+]
+
+
+def trait_probability(genes, trait):
+    """
+        Besides True and False, the trait can be None, meaning that we don't know
+        it. Having and not having the trait add up to 1, so an unknown trait
+        simply leaves the genes factor as it is.
+    """
+    if trait is None:
+        return 1
+    return PROBS["trait"][genes][trait]
+
+
+"""
+    The joint probability is a product with one factor per person, and that
+    factor only depends on the person's genes and trait and, for children,
+    on their parents' genes. That is at most 3 * 3 = 9 different factors for
+    people without parents in the data and 3 * 3 * 3 * 3 = 81 for children,
+    so we work all of them out once here and only look them up afterwards.
+"""
+FOUNDER_FACTOR = {
+    (genes, trait): PROBS["gene"][genes] * trait_probability(genes, trait)
+    for genes in range(3)
+    for trait in (True, False, None)
+}
+
+CHILD_FACTOR = {
+    (genes, trait, mother_genes, father_genes):
+        CHILD_GENE_PROB[genes][mother_genes][father_genes] * trait_probability(genes, trait)
+    for genes in range(3)
+    for trait in (True, False, None)
+    for mother_genes in range(3)
+    for father_genes in range(3)
+}
+
+
 def main():
 
     # Check for proper usage
@@ -59,44 +121,38 @@ def main():
         for person in people
     }
 
-    # Grabs a set with keys from the people dictionary.
-    names = set(people)
-    # Loop over all sets of people who might have the trait
-    """
-        'have_trait' basically refers to all subsets combinations.
-        It starts off with everyone and then skips the ones
-        that 'fail the evidence' that they have the trait given
-        that their trait information is known.
-    """
-    for have_trait in powerset(names):
-
-        # Check if current set of people violates known information
-        fails_evidence = any(
-            (people[person]["trait"] is not None and
-             people[person]["trait"] != (person in have_trait))
-            for person in names
-        )
-        if fails_evidence:
-            continue
-        
-        """
-            Now we know that everyone in the combination that have
-            made it thus far have either have the or has unknown
-            information, we can look at the subset again and grab
-            other information.
-
-        """
-        # Loop over all sets of people who might have the gene
-        for one_gene in powerset(names):
-            """
-                Removing any set that contains 'one_gene' that we selected above.
-                The idea here is that if someone carries one copy of the gene,
-                they cannot carry two copies of the gene.
-            """
-            for two_genes in powerset(names - one_gene):
-                # # Update probabilities with new joint probability
-                p = joint_probability(people, one_gene, two_genes, have_trait)
-                update(probabilities, one_gene, two_genes, have_trait, p)
+    """
+        Instead of building Python sets for every combination of people, we
+        give every person a number (their position in the file) and write a
+        group of people as a bitmask: person number i is in the group when
+        bit i is set. For example, with Harry = 0, James = 1 and Lily = 2,
+        the group {Harry, Lily} is 0b101 = 5.
+
+        This way every possible group is just a number in range(1 << n),
+        and checking if someone is in a group is a shift and an '&'.
+    """
+    names = list(people)
+    index = {name: i for i, name in enumerate(names)}
+
+    """
+        We don't need to loop over every set of people who might have the trait.
+        Once we know everyone's genes, the traits no longer depend on each other,
+        so instead of trying both values for the people whose trait we don't know,
+        we can add them up right away: the two values add up to 1, and each of
+        them gets its share PROBS["trait"][genes][trait] of the total (see
+        'update_bits'). People whose trait we know keep only the value we know.
+
+        This way we only go over the 3^n ways of giving out the genes instead
+        of 3^n * 2^n combinations, and none of them fail the evidence.
+    """
+    traits = [people[name]["trait"] for name in names]
+
+    # Everyone's parents, as numbers
+    mothers, fathers = parent_indices(people, names, index)
+
+    # Loop over all the ways of giving out the genes, with their joint probability
+    for one_gene, two_genes, p in gene_assignments(mothers, fathers, traits):
+        update_bits(probabilities, names, one_gene, two_genes, traits, p)
 
     # Ensure probabilities sum to 1
     normalize(probabilities)
@@ -135,14 +191,113 @@ def load_data(filename):
 
 def powerset(s):
     """
-    Return a list of all possible subsets of set s.
+    Return an iterator over all possible subsets of set s.
+
+    The subsets are made one at a time as they are needed instead of all
+    2^n of them up front, and as frozensets, which are hashed only once.
     """
-    s = list(s)
-    return [
-        set(s) for s in itertools.chain.from_iterable(
-            itertools.combinations(s, r) for r in range(len(s) + 1)
-        )
-    ]
+    s = tuple(s)
+    return (
+        frozenset(subset)
+        for r in range(len(s) + 1)
+        for subset in itertools.combinations(s, r)
+    )
+
+
+def parent_indices(people, names, index):
+    """
+        Returns two lists, 'mothers' and 'fathers', in the same order as 'names',
+        with the numbers of everyone's mother and father (None for people without
+        parents in the data). This way, looking up the parents of person number i
+        is 'mothers[i]' instead of two dictionary lookups for the name and two
+        more for the parents' numbers, every time we need them.
+    """
+    mothers = []
+    fathers = []
+    for name in names:
+        if people[name]["mother"] is None:
+            mothers.append(None)
+            fathers.append(None)
+        else:
+            mothers.append(index[people[name]["mother"]])
+            fathers.append(index[people[name]["father"]])
+    return mothers, fathers
+
+
+def parents_first(mothers, fathers):
+    """
+        Returns the numbers of everyone in an order where parents always
+        come before their children.
+    """
+    order = []
+    placed = set()
+
+    def place(i):
+        if i in placed:
+            return
+        placed.add(i)
+        # The parents have to be placed before we can place the child
+        if mothers[i] is not None:
+            place(mothers[i])
+            place(fathers[i])
+        order.append(i)
+
+    for i in range(len(mothers)):
+        place(i)
+    return order
+
+
+def gene_assignments(mothers, fathers, traits):
+    """
+        Yields (one_gene, two_genes, p) for every way of giving out the genes,
+        where the gene groups are bitmasks and 'p' is their joint probability
+        (see 'joint_probability').
+
+        Two assignments that only differ in the genes of the last person share
+        the factors of everyone else, so instead of multiplying all n factors
+        again for every assignment, we give out the genes one person at a time
+        and carry the product of the factors so far (a tree of choices: each
+        level multiplies in one more person). Most of the multiplications are
+        then shared, and we only do about 1.5 per assignment instead of n.
+
+        We go over the people with parents before children, so that when we get
+        to a child, we already know the genes of their mother and father.
+    """
+    genes = [0] * len(traits)
+
+    # For everyone, in that order: their number, trait and the numbers of their parents
+    steps = [(i, traits[i], mothers[i], fathers[i]) for i in parents_first(mothers, fathers)]
+
+    def assign(step, one_gene, two_genes, p):
+        # Everyone has their genes, so we have a full assignment.
+        if step == len(steps):
+            yield one_gene, two_genes, p
+            return
+
+        i, trait, mother, father = steps[step]
+        for count in range(3):
+            genes[i] = count
+            if mother is None:
+                factor = FOUNDER_FACTOR[count, trait]
+            else:
+                factor = CHILD_FACTOR[count, trait, genes[mother], genes[father]]
+
+            yield from assign(
+                step + 1,
+                one_gene | (count == 1) << i,
+                two_genes | (count == 2) << i,
+                p * factor
+            )
+
+    return assign(0, 0, 0, 1)
+
+
+def gene_count(i, one_gene, two_genes):
+    """
+        Returns how many copies of the gene person number i has. One person
+        can't be in both masks, so at most one of the two terms is not 0.
+    """
+    return (two_genes >> i & 1) * 2 + (one_gene >> i & 1)
 
 
 def joint_probability(people, one_gene, two_genes, have_trait):
@@ -160,64 +315,32 @@ def joint_probability(people, one_gene, two_genes, have_trait):
     - Multiply all probabilities
 
     """
-    
-    ## VARIABLES
-    p_one_gene = 1
-    p_two_genes = 1
-    p_no_gene = 1
-    p_trait = 1
-    p_no_trait = 1
-
-
-    ## STEP 1 - Person in one gene having one gene
-    # First check that one_gene set has people in it.
-    if len(one_gene) > 0:
-        for person in one_gene:
-            mother = people[person]["mother"]
-            father = people[person]["father"]
-            # Check if they have a mother or father
-            if mother is not None:
-                # Both mother and father has one gene
-                if mother in one_gene and father in one_gene:
-                    p_one_gene = (0.49 * 0.99) + (0.01 * 0.01)
-                # Mother has one gene; father has no gene
-                if mother in one_gene and father not in one_gene and father not in two_genes:
-                    p_one_gene = (0.49 * 0.99) + (0.01 * 0.01)
-                # Father has one gene; mother has no gene
-                if mother not in one_gene and mother not in two_genes and father in one_gene:
-                    p_one_gene = (0.01 * 0.01) + (0.49 * 0.99)
-
-                # Neither father nor mother has the gene
-                if mother not in one_gene and mother not in two_genes and father not in one_gene and father not in two_genes:
-                   p_one_gene = 0
-
-                # Both have two genes
-                if mother in two_genes and father in two_genes:
-                    p_one_gene = 1 - ((0.01 * 0.01) + (0.01 * 0.01))
-
-                # Mother has two genes, father has no genes
-                if mother in two_genes and father not in one_gene and father not in two_genes:
-                    p_one_gene = (0.99 * 0.99) + (0.01 * 0.01)
-
-                # Father has two genes, mom has no genes
-                if mother not in one_gene and mother not in two_genes and father in two_genes:
-                    p_one_gene = (0.01 * 0.01) + (0.99 * 0.99)
-
-            # Calculate values for people with no parents
-            else:
-                p_one_gene = PROBS["gene"][1]
-                
-    ## STEP 2 - Person having two genes
-    if len(two_genes) > 0:
-            for person in one_gene:
-                mother = people[person]["mother"]
-                father = people[person]["father"]
-            
-            # Check if they have a mother or father
-            if mother is not None:
-                
-            else:
-                p_one_gene = PROBS["gene"][2]
+    """
+        Everyone contributes one factor to the product: the probability of
+        their number of genes times the probability of their trait given
+        those genes. We look it up in FOUNDER_FACTOR for people without
+        parents in the data and in CHILD_FACTOR for everyone else.
+
+        We first work out everyone's number of genes once, so that a parent's
+        genes are a single lookup for each of their children, and then go over
+        everyone a single time, multiplying in their factor.
+    """
+    genes = {
+        person: 2 if person in two_genes else 1 if person in one_gene else 0
+        for person in people
+    }
+
+    p = 1
+    for person in people:
+        mother = people[person]["mother"]
+        trait = person in have_trait
+
+        if mother is None:
+            p *= FOUNDER_FACTOR[genes[person], trait]
+        else:
+            p *= CHILD_FACTOR[genes[person], trait, genes[mother], genes[people[person]["father"]]]
+
+    return p
 
 
 def update(probabilities, one_gene, two_genes, have_trait, p):
@@ -227,7 +350,26 @@ def update(probabilities, one_gene, two_genes, have_trait, p):
     Which value for each distribution is updated depends on whether
     the person is in `have_gene` and `have_trait`, respectively.
     """
-    raise NotImplementedError
+    for person in probabilities:
+        genes = 2 if person in two_genes else 1 if person in one_gene else 0
+        probabilities[person]["gene"][genes] += p
+        probabilities[person]["trait"][person in have_trait] += p
+
+
+def update_bits(probabilities, names, one_gene, two_genes, traits, p):
+    """
+        Same as 'update' but the gene groups are bitmasks over 'names' and
+        'traits' holds everyone's trait in the same order. When a trait is
+        None, 'p' covers both values, so we split it between them.
+    """
+    for i, person in enumerate(names):
+        genes = gene_count(i, one_gene, two_genes)
+        probabilities[person]["gene"][genes] += p
+        if traits[i] is None:
+            probabilities[person]["trait"][True] += p * PROBS["trait"][genes][True]
+            probabilities[person]["trait"][False] += p * PROBS["trait"][genes][False]
+        else:
+            probabilities[person]["trait"][traits[i]] += p
 
 
 def normalize(probabilities):
@@ -235,7 +377,12 @@ def normalize(probabilities):
     Update `probabilities` such that each probability distribution
     is normalized (i.e., sums to 1, with relative proportions the same).
     """
-    raise NotImplementedError
+    for person in probabilities:
+        for field in probabilities[person]:
+            distribution = probabilities[person][field]
+            total = sum(distribution.values())
+            for value in distribution:
+                distribution[value] /= total
 
 
 if __name__ == "__main__":
@@ -2,12 +2,24 @@ import os
 import random
 import re
 import sys
-import copy
 import math
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 
 DAMPING = 0.85
 SAMPLES = 10000
 
+# From this many samples on, the random walk is split over all the CPU cores
+PARALLEL_SAMPLES = 1000000
+
+# The shortest walk that is worth starting a process of its own for
+WALK_SAMPLES = 250000
+
+# Matches the address of every <a href="..."> link. It is compiled once and works on
+# the raw bytes of a file, so the files don't need to be decoded to text first.
+HREF_PATTERN = re.compile(rb'<a\s[^>]*?href="([^"]*)"')
+
 
 def main():
     if len(sys.argv) != 2:
@@ -37,9 +49,10 @@ def crawl(directory):
     for filename in os.listdir(directory):
         if not filename.endswith(".html"):
             continue
-        with open(os.path.join(directory, filename)) as f:
+        with open(os.path.join(directory, filename), "rb") as f:
             contents = f.read()
-            links = re.findall(r"<a\s+(?:[^>]*?)href=\"([^\"]*)\"", contents)
+            # Only the links themselves are decoded back to text
+            links = [link.decode() for link in HREF_PATTERN.findall(contents)]
             # This is basically excluding the filename from the set of links
             # if it's found there. This also means that there is only one 
             # link to each page per document. There cannot be a page that
@@ -70,70 +83,68 @@ def transition_model(corpus, page, damping_factor):
     """ 
         We will begin by grabbing the links that are on our current
         page using current page as a key in our corpus.
-    """
-    links = corpus[page]
 
-    ## STEP 2
+        If a page has no link, then we act as if it has links
+        to all pages, including itself.
     """
-        Create a copy of corpus so that we can modify the dictionary
-        and add probability values to it. This way, we can store this
-        information. 
-        Note that corpus_p stands for probabilities in corpus.
-    """
-    corpus_p = copy.deepcopy(corpus)
+    links = corpus[page] or corpus
 
-    # We will start with 0 probability for each value by replacing the values
-    # of keys in corpus.
-    for link in corpus_p:
-        corpus_p[link] = 0
-    
-    ## STEP 3
+    ## STEP 2
     """
         Given a dampening factor (d), there will always be a default probability
         of selecting any page from the corpus, including the page we are on.
-        Hence we will add that probability to each.
+        This is the same for every page, so we can create the new dictionary,
+        with the same keys as corpus, already filled in with it. This way,
+        we don't need to copy the sets of links or go over the pages again.
+        Note that corpus_p stands for probabilities in corpus.
     """
     # Total random selection
     undamped = 1 - damping_factor
 
-    # Total count of links in corpus
-    corpus_count = len(corpus_p)
+    # Probability of being selected for each page is equal
+    undamped_p_each = undamped / len(corpus)
 
-    # Probability of being selected for each link is equal
-    undamped_p_each = undamped/corpus_count
+    corpus_p = dict.fromkeys(corpus, undamped_p_each)
 
-    # Setting the random selection probability to each link's 
-    # probability since they are 0.
-    for link in corpus_p:
-        corpus_p[link] = undamped_p_each
-
-
-    ## STEP 4
+    ## STEP 3
     """
         As a last step, we need to add the damped part to the 
         probabilities. This would only include the links on the
-        current page.
+        current page, so we only need to go over those.
     """
-    links_count = len(links)
-
-    # If a page has no link, then we act as if it has links 
-    # to all pages, which means that links_count = corpus_count
-    if links_count == 0:
-        links_count = corpus_count
-
     # Each link has the same chance of being selected
-    damped_p_each = damping_factor/links_count
-
-    # We need to add the damped probability to distributed
-    # undamped probability in corpus_p. We will only add
-    # to links found on the page.
-    for page in corpus_p:
-        if page in links:
-            current_probability = corpus_p[page]
-            corpus_p[page] = current_probability + damped_p_each
+    damped_p_each = damping_factor / len(links)
+
+    for link in links:
+        corpus_p[link] += damped_p_each
     return corpus_p
 
 
+def link_arrays(corpus):
+    """
+        Turns the corpus into page numbers and flat arrays, which is how
+        'sample_pagerank' and 'iterate_pagerank' work with it. Returns:
+            1 - 'pages_list', the list of all pages in corpus. The page
+                number of a page is its position in this list.
+            2 - 'links', the links of every page, as page numbers, one
+                page after the other.
+            3 - 'link_starts', where the links of every page start in 'links'.
+                The links of page number i are the ones from link_starts[i]
+                up to (but not including) link_starts[i + 1], so a page
+                without links starts and ends at the same place.
+    """
+    pages_list = list(corpus.keys())
+    page_numbers = {page: i for i, page in enumerate(pages_list)}
+
+    link_starts = array("i", [0])
+    links = array("i")
+    for page in pages_list:
+        links.extend(page_numbers[link] for link in corpus[page])
+        link_starts.append(len(links))
+
+    return pages_list, link_starts, links
+
+
 def sample_pagerank(corpus, damping_factor, n):
     """
     Return PageRank values for each page by sampling `n` pages
@@ -146,82 +157,22 @@ def sample_pagerank(corpus, damping_factor, n):
 
     ## STEP 1
     """ 
-        Let's define two variables to hold our states. We will
-        need states for the following:
-            1 - A way to keep track of how many pages we have visited.
-                We will use this number to compare against sample size 'n'
-                so that we can know when to stop.
-            2 - A dictionary to store how many times we have visited a
-                specific page from the corpus.
-    """
-    pages_visited = 0
-    corpus_visits = copy.deepcopy(corpus)
-    # Setting initial counts to 0.
-    for page in corpus_visits:
-        corpus_visits[page] = 0
-
-    ## STEP 2
-    """ 
-        We will select an initial page randomly without transition
-        model since we don't have any 'current' page.
-    """
-    # Making a list of all pages in corpus
-    pages_list = list(corpus.keys())
-
-    """
-        Making a random selection with equal probability based on the list
-        Since we are not using any weights, it is better to use random.choice
-        instead of random.choices since it returns one object.
-    """
-    first_page = random.choice(pages_list)
-
-    # Setting current page for the first time
-    current_page = first_page
-
-    # Adding to the count of the page chosen
-    corpus_visits[current_page] = 1
-
-    # Increasing visited pages count
-    pages_visited += 1
-        
-
-    ## STEP 3
-    """
-        We need to define a loop whereby we increase pages_visited
-        as we choose to visit a page depending on whether we will
-        choose at random or will use the links. 
-
-        Initially, if we have not visited any page, we will choose
-        one at random. Then, we will increase the count of that 
-        page in our corpus_visits. 
-
-        After for all of them, we will keep using the transition
-        model and make a selection accordingly until we reach the
-        desired sample count.
+        Instead of page names, we will work with page numbers: the position
+        of the page in 'pages_list'. This way the whole walk can be done with
+        flat arrays indexed by page numbers (see 'link_arrays' and 'random_walk').
     """
-    # Going through all the pages until we reach desired sample size 
-    while pages_visited < n:
-            # Grabbing probability of visiting a page given a current page
-            probability_distribution = transition_model(corpus, current_page, damping_factor)
-            
-            # Getting the list of pages and their probabilies separately to pass to random function.
-            list_pages = list(probability_distribution.keys())
-            list_probabilities = list(probability_distribution.values())
-            
-            # Getting the next page to visit based on the probabilities
-            next_page = random.choices(list_pages, list_probabilities)[0]
-
-            # Setting the current page to next page (i.e. visiting the page)
-            current_page = next_page
-
-            # Getting the current count of the visited page.
-            current_page_count = corpus_visits[current_page]
+    pages_list, link_starts, links = link_arrays(corpus)
+    page_count = len(pages_list)
 
-            # Increasing the count of the current page
-            corpus_visits[current_page] = current_page_count + 1
+    ## STEP 2
+    # Walking through n pages and counting how many times we visit each of them
+    if n < PARALLEL_SAMPLES:
+        visits = random_walk(link_starts, links, page_count, damping_factor, n)
+    else:
+        visits = parallel_random_walk(link_starts, links, page_count, damping_factor, n)
 
-            # Increasing the count of visited pages in total
-            pages_visited += 1
+    # Going back from page numbers to page names
+    corpus_visits = {page: visits[i] for i, page in enumerate(pages_list)}
 
     ## STEP 4
     """
@@ -229,29 +180,20 @@ def sample_pagerank(corpus, damping_factor, n):
         we can create a new dictionary where we will replace the
         values with probabilities given a sample size n.
 
-        We are creating a copy because changing a dictionary while
-        looping over it can cause issues.
+        We are creating a new dictionary because changing a dictionary
+        while looping over it can cause issues. We build it in one go,
+        dividing the count of each page in corpus_visits by total sample
+        size to get the ratio, which we record as the PageRank for that page.
 
         This will essentially represent our PageRank values.
     """
-    page_ranks = copy.deepcopy(corpus_visits)
-    """
-        Let's loop over each page in corpus_visits and divide the
-        count there by total sample size to get the ratio, which
-        we can record as our PageRank for that page in page_ranks.
-    """
-    for page in corpus_visits:
-        page_count = corpus_visits[page]
-        page_rank = page_count / n
-        
-        # Let's grab the page in page_ranks and update its values
-        page_ranks[page] = page_rank
-    
+    page_ranks = {page: visits_count / n for page, visits_count in corpus_visits.items()}
+
     ## STEP 5
-    # Checking that ranking values add up to 1 before returning
-    ranks_total = 0
-    for page in page_ranks:
-        ranks_total += page_ranks[page]
+    # Checking that ranking values add up to 1 before returning.
+    # 'math.fsum' keeps track of the rounding errors while adding, so the
+    # total doesn't drift away from 1 however many pages there are.
+    ranks_total = math.fsum(page_ranks.values())
     
     # Checking if they are equal up to this number. 
     # There can be small variations given the issues with floating
@@ -262,67 +204,112 @@ def sample_pagerank(corpus, damping_factor, n):
         raise Exception(f"Check your sample ranking. Sum of all ranks should be 1. You've got {ranks_total}")
 
 
-def page_rank_algorithm(corpus, current_ranks, desired_page, damping_factor):
+def random_walk(link_starts, links, page_count, damping_factor, n, rng=random):
     """
-        This is a helper function we are defining to
-        calculate the result of page_rank_algorithm.
-        The main calculation is to find the sum of all 
-        pages where page 'i' has a link to current_page 
-        that has been passed in the function's arguments.
+        Visits n pages, starting from a random one, and returns an array with
+        the number of times each page number was visited. 'link_starts' and
+        'links' hold the links of every page (see 'link_arrays'). The random
+        numbers come from 'rng', which is the 'random' module unless a
+        'random.Random' of its own is given.
 
-        For each linked page, we will look at its own
-        PageRank, divide by number of links and add 
-        everything up.
-    """
-    ## STEP 1
-    linked_pages_sum = 0
-    linked_pages = {}
-    
+        We don't need the full transition model of the current page to pick
+        the next one. The model is made of two parts: with probability
+        'damping_factor' a random link of the page, and otherwise a random
+        page of the corpus. So we first pick which of the two happens, and then
+        pick a link or a page at random, which only takes two random numbers.
+        A page without links counts as linking to every page, which is the
+        same as picking a random page of the corpus.
+
+        Everything here is numbers and flat arrays, so the loop does no
+        dictionary lookups and creates no objects at all.
     """
-        Adding all the pages with links to desired_page along with 
-        total number of links that they reference.
-
-        However, we will first check if a page has no links. If yes,
-        then we will assume a link to the direct page and say that 
-        total number of links it has is equal to the number of pages
-        in the corpus since having no links is assumed to be the same 
-        as having links to all pages.
-    """
-    for page in corpus:
-        # Making sure that we are not counting the page we are already on.
-        if desired_page is not page:
-            # Checking separately for the case where a page has no links
-            if len(corpus[page]) == 0:
-                linked_pages[page] = len(corpus)
-            
-            elif desired_page in corpus[page]:
-                linked_pages[page] = len(corpus[page])
+    # Setting initial counts to 0.
+    visits = array("q", [0]) * page_count
 
-    ## STEP 2
+    """ 
+        We will select an initial page randomly without transition
+        model since we don't have any 'current' page.
     """
-        Now, we need to get the probability of visiting the desired
-        page from each linked page by dividing the probability of 
-        visiting the linked page (PageRank(i)) by number of links
-        it has.
+    # Looking up 'rng.random' takes time on every call, so we look the two
+    # functions up once and keep them in local names for the loop below.
+    next_random = rng.random
+    next_randrange = rng.randrange
+
+    current_page = next_randrange(page_count)
+    visits[current_page] = 1
+
+    # After that, we keep picking the next page until we reach the desired sample count.
+    for _ in range(n - 1):
+        first_link = link_starts[current_page]
+        links_count = link_starts[current_page + 1] - first_link
+
+        if next_random() < damping_factor and links_count > 0:
+            # Following a random link of the current page
+            current_page = links[first_link + next_randrange(links_count)]
+        else:
+            # Going to a random page of the corpus
+            current_page = next_randrange(page_count)
+
+        # Increasing the count of the current page
+        visits[current_page] += 1
+
+    return visits
+
+
+def parallel_random_walk(link_starts, links, page_count, damping_factor, n):
     """
-    for page in linked_pages:
-        visit_probability = current_ranks[page] / linked_pages[page]
-        linked_pages_sum += visit_probability
-    
+        Same as 'random_walk', but split into one shorter walk for each CPU core,
+        all walking at the same time in separate processes.
 
-    ## STEP 3
+        Each walk starts from a random page of its own. A long walk forgets where
+        it started, so counting the visits of a few long walks together gives the
+        same PageRank as one walk that is a few times longer.
+
+        Every walk gets its own 'random.Random', seeded from the 'random' module,
+        so the walks don't repeat each other's random numbers and the result
+        still depends on 'random.seed' only.
+
+        We never start more walks than there are samples for: each walk gets
+        at least WALK_SAMPLES of them, since a process takes time to start.
     """
-        Now we can do the calculate the result of PageRank. 
-        The full formula is
-            PR(A) = ((1-d)/N) + d * linked_pages_sum
-        where d is dampening factor and N is the number of
-        pages in corpus
+    walks_count = max(1, min(usable_cpu_count(), n // WALK_SAMPLES))
+    if walks_count == 1:
+        return random_walk(link_starts, links, page_count, damping_factor, n)
+
+    # Splitting the n samples as evenly as possible between the walks
+    lengths = [n // walks_count + (i < n % walks_count) for i in range(walks_count)]
+    rngs = [random.Random(random.getrandbits(64)) for _ in range(walks_count)]
+
+    with ProcessPoolExecutor(walks_count) as executor:
+        walks_visits = executor.map(
+            random_walk, repeat(link_starts), repeat(links), repeat(page_count),
+            repeat(damping_factor), lengths, rngs
+        )
+
+        # Adding up the visits of every page over all the walks
+        visits = array("q", [0]) * page_count
+        for walk_visits in walks_visits:
+            for i, count in enumerate(walk_visits):
+                visits[i] += count
+
+    return visits
+
+
+def usable_cpu_count():
     """
-    page_count = len(corpus)
+        Returns the number of CPU cores this process is allowed to run on.
 
-    page_rank = ((1 - damping_factor) / page_count) + (damping_factor * linked_pages_sum)
-    
-    return page_rank
+        'os.cpu_count' counts every core of the machine, even when we are
+        only allowed to use a few of them (e.g. in a container), so we ask
+        for the cores of this process where Python lets us.
+    """
+    if hasattr(os, "process_cpu_count"):
+        # Python 3.13 and later
+        return os.process_cpu_count() or 1
+    if hasattr(os, "sched_getaffinity"):
+        # Linux and some other Unix systems
+        return len(os.sched_getaffinity(0)) or 1
+    return os.cpu_count() or 1
 
 
 def iterate_pagerank(corpus, damping_factor):
@@ -337,64 +324,98 @@ def iterate_pagerank(corpus, damping_factor):
     ## STEP 1
     """
         Once again, let's begin by defining the basic variables
-        that we will use. We will define:
+        that we will use. Like in 'sample_pagerank', we will work with
+        page numbers instead of page names. We will define:
             1 - Total number of pages in corpus
-            2 - A new dictionary where we will keep track of the
-                page ranks.
-            3 - A second dictionary where we can keep the previous
-                rankings and compare values. Initially, previous
-                ranks will be an empty dictionary.
-            4 - Highest Deviation Factor - a number that represents
-                how much the PageRank of a page has changed from last
-                iteration. We will initally set it to negative infinity
-                to be the highest value so that any value will be higher
-                than that initially.
-    """
-    page_count = len(corpus)
-    current_ranks = copy.deepcopy(corpus)
-    previous_ranks = {}
-    
-    # Setting initial ranks to 1/N where N represents page count
-    for page in current_ranks:
-        current_ranks[page] = 1 /page_count
+            2 - For every page, the pages that link to it (as page
+                numbers), and the pages that have no links at all.
+            3 - The part of its rank that every page hands to each
+                page it links to (see STEP 2).
+            4 - Lists where we will keep track of the page ranks and
+                of how much they changed, indexed by page number.
+    """
+    pages_list, link_starts, links = link_arrays(corpus)
+    page_count = len(pages_list)
+    links_counts = [link_starts[i + 1] - link_starts[i] for i in range(page_count)]
+
+    """
+        The corpus tells us which pages a page links to, but the formula needs
+        the opposite: which pages link to a page. We turn the links around once
+        here, so that the loop never has to search the corpus for them.
+    """
+    linked_from = [[] for _ in range(page_count)]
+    no_links = [i for i in range(page_count) if links_counts[i] == 0]
+    for i in range(page_count):
+        for link in links[link_starts[i]:link_starts[i + 1]]:
+            linked_from[link].append(i)
+
+    # The number of links of a page never changes, so we work out d / NumLinks(i)
+    # once here instead of in every round of the loop. A page without links
+    # links to all N pages.
+    link_weights = [damping_factor / (links_count or page_count) for links_count in links_counts]
+
+    """
+        Rather than starting every page at 1/N and working out the full ranks again
+        in every round, we only pass along how much the ranks changed in the last
+        round. Since the formula is just sums and products, the change of a page's
+        rank in a round comes from the changes of the pages that link to it in
+        the round before:
+            change(p) = d * sum(change(i) / NumLinks(i))
+
+        Every page begins with its random jump part, (1-d)/N. That is the first
+        change, and each round passes on d of what came in the round before.
+        The changes shrink quickly and the ranks stop moving, without ever
+        recomputing the part that has already settled.
+    """
+    rank_changes = [(1 - damping_factor) / page_count] * page_count
+    current_ranks = rank_changes[:]
+
+    # The changes of the next round are written into a second list of the same
+    # size. After each round the two lists swap places, so no new lists are
+    # created inside the loop.
+    next_changes = [0.0] * page_count
 
     ## STEP 2
     """
-        We need to create an infinite loop whereby we continue to calculate
-        PageRank values of each page until highest deviation of each page
-        is not more than 0.001. Then, we will exit the loop
+        We need to create an infinite loop whereby we continue to pass along
+        the changes until the highest change of a page is not more than 0.001.
+        Then, we will exit the loop
     """
-    run_count = 0
     while True:
-        # Begin by creating a new dictionary where we will update the values
-        new_ranks = copy.deepcopy(current_ranks)
+        """
+            The pages that link to p are already waiting for us in
+            'linked_from', so the sum is a single pass over them.
 
-        # Loop over values in current_ranks and update values in new ranks
-        for page in current_ranks:
-            new_ranks[page] = page_rank_algorithm(corpus, current_ranks, page, damping_factor)
-        
+            Having no links is the same as having a link to every page,
+            including itself. That share is the same for every page, so we
+            add it up once and start every page from it.
+        """
+        no_links_share = sum(rank_changes[i] * link_weights[i] for i in no_links)
 
-        # Assign current ranks to previous ranks and new ranks to current ranks
-        previous_ranks = copy.deepcopy(current_ranks)
-        current_ranks = copy.deepcopy(new_ranks)
+        for p, pages_linking in enumerate(linked_from):
+            change = no_links_share + sum(rank_changes[i] * link_weights[i] for i in pages_linking)
+            next_changes[p] = change
+            current_ranks[p] += change
 
-        """
-            The idea below is to check if there are any pages that have a deviation
-            of more than 0.001 between its current and previous ranking.
+        rank_changes, next_changes = next_changes, rank_changes
 
-            If yes, we continue the loop. If no, we stop. We need to use absolute 
-            values since deviation can be in both directions
+        """
+            The changes are never negative, so the highest deviation from the
+            previous ranks is simply the largest change.
 
+            Once we stop, the changes still to come would add up to d times
+            as much rank as the one before, i.e. the last change times
+            d + d^2 + ... = d/(1-d) in total. Adding that to the ranks puts
+            back the rank that was left out, so the ranks add up to exactly 1.
         """
-        total_deviations = 0
-        for page in current_ranks:
-            if abs(current_ranks[page] - previous_ranks[page]) > 0.001:
-                total_deviations += 1
-                run_count += 1
-        
-        if total_deviations == 0:
-            run_count += 1
-            return current_ranks
+        if max(rank_changes) <= 0.001:
+            remaining = damping_factor / (1 - damping_factor)
+
+            # Going back from page numbers to page names
+            return {
+                page: current_ranks[i] + rank_changes[i] * remaining
+                for i, page in enumerate(pages_list)
+            }
 
 
 if __name__ == "__main__":